@@ -2,7 +2,69 @@ from PIL import Image
 from PIL import ImageFilter
 import numpy as np
 from colorama import init, Fore
-from os.path import exists
+import os
+
+_NUMBERS = np.array([str(i) for i in range(256)])
+
+
+class ThumbnailPyramid:
+    """
+    Multi-resolution cache of a thumbnail, built once per image.
+    """
+
+    def __init__(
+        self, image: str | Image.Image, working_width: int = 320, min_width: int = 8
+    ) -> None:
+        """
+        Decodes and sharpens the image once, then caches halved copies of it so any width can be served with a cheap resize.
+
+        :param image: The path to the image file, or an already opened image.
+        :type image: str | Image.Image
+        :param working_width: The width the source is reduced to before sharpening.
+        :type working_width: int
+        :param min_width: The smallest level to keep in the pyramid.
+        :type min_width: int
+        """
+        source = Image.open(image) if isinstance(image, str) else image
+        self.width, self.height = source.size
+        # Only JPEG supports draft mode, other formats ignore it
+        source.draft("RGB", (working_width, working_width * self.height // self.width))
+        img = source.convert("RGB")
+        if isinstance(image, str):
+            source.close()
+        if img.width > working_width:
+            img = img.resize(
+                (working_width, max(1, int(img.height * working_width / img.width))),
+                Image.Resampling.BOX,
+            )
+        img = img.filter(ImageFilter.SHARPEN)
+
+        self.levels = [img]
+        while img.width // 2 >= min_width and img.height // 2 >= 1:
+            img = img.reduce(2)
+            self.levels.append(img)
+
+    def get(self, width: int, height: int = -1) -> Image.Image:
+        """
+        Returns the image at the given size, resized from the nearest larger level.
+
+        :param width: The desired width of the image.
+        :type width: int
+        :param height: The desired Height of the image. If set to -1, height will be auto_adjusted
+        :type height: int
+        :return: The resized image.
+        :rtype: Image
+        """
+        if height == -1:
+            height = int(self.height * (width / self.width))
+        level = self.levels[0]
+        for candidate in self.levels:
+            if candidate.width < width or candidate.height < height:
+                break
+            level = candidate
+        if level.size == (width, height):
+            return level
+        return level.resize((width, height))
 
 
 class AsciiImage:
@@ -20,9 +82,11 @@ class AsciiImage:
         self.image = None
         self.image_path = None
         if isinstance(image, Image.Image):
-            self.Image = image
+            self.image = image
         else:
             self.image_path = image
+        self.pyramid: ThumbnailPyramid | None = None
+        self._pyramid_key = None
         self.characters = " `.-':_,^=;><+!rc*/z?sLTv)J7(|Fi{C}fI31tlu[neoZ5Yxjya]2ESwqkP6h9d4VpOGbUAKXHm8RD#$Bg0MNWQ%&@"
         init(autoreset=True)
 
@@ -31,6 +95,7 @@ class AsciiImage:
     ) -> Image.Image:
         """
         Formats the image by resizing and sharpening. Maintains aspect ratio.
+        Goes through ThumbnailPyramid, so it matches the render paths. Use get_pyramid to reuse the pyramid between sizes.
 
         :param image: The image object to format.
         :type image: Image.Image
@@ -41,13 +106,30 @@ class AsciiImage:
         :return: The formatted image.
         :rtype: Image
         """
-        width = width
-        if height == -1:
-            height = int(image.height * (width / image.width))
-        image = image.resize((width, height))
-        image = image.filter(ImageFilter.SHARPEN)
-        # image.quantize(len(characters), Image.Quantize.MAXCOVERAGE)
-        return image
+        return ThumbnailPyramid(image).get(width, height)
+
+    def get_pyramid(self) -> ThumbnailPyramid | None:
+        """
+        Returns the pyramid for the current image, rebuilding it only when the image file changes.
+
+        :return: The thumbnail pyramid, or None if there is no image yet.
+        :rtype: ThumbnailPyramid | None
+        """
+        if self.image_path:
+            try:
+                stat = os.stat(self.image_path)
+            except OSError:
+                return self.pyramid
+            key = (stat.st_mtime_ns, stat.st_size)
+            if key != self._pyramid_key:
+                try:
+                    self.pyramid = ThumbnailPyramid(self.image_path)
+                    self._pyramid_key = key
+                except OSError:
+                    pass  # File is still being written, keep the previous one
+        elif self.image and self.pyramid is None:
+            self.pyramid = ThumbnailPyramid(self.image)
+        return self.pyramid
 
     def get_color_code(self, r, g, b) -> str:
         """
@@ -67,11 +149,11 @@ class AsciiImage:
 
         :param width: The desired width of the ASCII art.
         """
-        if self.image_path and not exists(self.image_path) and not self.image:
+        pyramid = self.get_pyramid()
+        if not pyramid:
             return []
 
-        img = Image.open(self.image_path) if self.image_path else self.image
-        img = self.format_image(img, width, width if square else -1)
+        img = pyramid.get(width, width if square else -1)
         g_img = img.convert("L")  # Grayscale
         for y in range(g_img.height):
             for x in range(g_img.width):
@@ -91,11 +173,11 @@ class AsciiImage:
 
         :param width: The desired width of the ASCII art.
         """
-        if self.image_path and not exists(self.image_path) and not self.image:
+        pyramid = self.get_pyramid()
+        if not pyramid:
             return []
 
-        img = Image.open(self.image_path) if self.image_path else self.image
-        img = self.format_image(img, width, width if square else -1)
+        img = pyramid.get(width, width if square else -1)
         g_img = img.convert("L")  # Grayscale
         image_str = []
         for y in range(g_img.height):
@@ -114,3 +196,50 @@ class AsciiImage:
                     line.append(self.characters[pixel] + self.characters[pixel])
             image_str.append("".join(line) + "\n" + Fore.RESET)
         return image_str
+
+    def _color_codes(self, pixels: np.ndarray, layer: str) -> np.ndarray:
+        """
+        Builds the ANSI escape codes for an array of pixels, only where the color changes from the previous cell.
+
+        :param pixels: RGB pixels as a (rows, columns, 3) array.
+        :type pixels: np.ndarray
+        :param layer: "38" for the foreground, "48" for the background.
+        :type layer: str
+        """
+        r, g, b = (_NUMBERS[pixels[..., i]] for i in range(3))
+        codes = np.strings.add(f"\033[{layer};2;", r)
+        for part in (";", g, ";", b, "m"):
+            codes = np.strings.add(codes, part)
+        changed = np.ones(pixels.shape[:2], dtype=bool)
+        changed[:, 1:] = np.any(pixels[:, 1:] != pixels[:, :-1], axis=-1)
+        return np.where(changed, codes, "")
+
+    def half_block_image_str(
+        self, width, square: bool, color_step: int = 8
+    ) -> list[str]:
+        """
+        Returns the image as a list of strings using upper half blocks, two pixel rows per line.
+        Takes up the same space as ascii_image_str, with four times the pixels.
+
+        :param width: The desired width of the ASCII art. The output is twice as many columns wide.
+        :param color_step: Colors are rounded down to multiples of this, so neighbouring cells share escape codes more often. 1 keeps full color.
+        :type color_step: int
+        """
+        pyramid = self.get_pyramid()
+        if not pyramid:
+            return []
+
+        rows = width if square else int(pyramid.height * (width / pyramid.width))
+        img = pyramid.get(width * 2, rows * 2)
+        pixels = np.asarray(img.convert("RGB")) // color_step * color_step
+        top, bottom = pixels[0::2].astype(np.int16), pixels[1::2]
+        # Both halves the same color: a space on the background is enough
+        solid = np.all(top == bottom, axis=-1)
+        top_codes = np.where(
+            solid, "", self._color_codes(np.where(solid[..., None], -1, top), "38")
+        )
+        cells = np.strings.add(
+            np.strings.add(top_codes, self._color_codes(bottom, "48")),
+            np.where(solid, " ", "\u2580"),
+        )
+        return ["".join(line) + "\033[0m\n" for line in cells]
@@ -1,3 +1,4 @@
+from crossover import CrossoverFilterbank
 import pyaudiowpatch as pyaudio
 import numpy as np
 import threading
@@ -7,11 +8,14 @@ import os
 
 
 class Stream:
-    def __init__(self) -> None:
+    def __init__(self, input_device: bool = False) -> None:
         """
         A Audio stream class to capture system audio using WASAPI loopback.
         Note: This only works on Windows with WASAPI support.
-        Note: Only one instance of this class should be created to avoid conflicts.
+        Note: Only one instance per device should be created to avoid conflicts.
+
+        :param input_device: Capture the default input device (e.g. a microphone) instead of the loopback.
+        :type input_device: bool
         """
 
         self.frames = []
@@ -19,7 +23,10 @@ class Stream:
         if pyaudio.paNotInitialized:
             self.p = pyaudio.PyAudio()
 
-        self.loopback_info = self.p.get_default_wasapi_loopback()
+        if input_device:
+            self.loopback_info = self.p.get_default_input_device_info()
+        else:
+            self.loopback_info = self.p.get_default_wasapi_loopback()
         self.sample_rate = self.loopback_info["defaultSampleRate"]
         self.channels = self.loopback_info["maxInputChannels"]
         # print("Using loopback device:", self.loopback_info["name"])
@@ -119,17 +126,121 @@ class Stream:
         self.p.terminate()
 
 
+class AutoGain:
+    def __init__(
+        self,
+        percentiles: tuple[float, float] = (0.1, 0.95),
+        half_life: int = 180,
+        refresh: int = 30,
+        warmup: int = 300,
+        min_span: float = 12,
+        db_range: tuple[float, float] = (-100, 100),
+        bin_width: float = 0.5,
+    ) -> None:
+        """
+        Derives a band's db range from the levels it actually sees, using a histogram with exponential forgetting.
+        Memory is fixed by db_range / bin_width and each update is O(1).
+
+        Adaptation time: a bound moves once the older levels weigh less than its percentile allows.
+        With the defaults, after the music gets much quieter the high bound follows in about 4.3 half-lives (~780 updates, ~13 s at 60 fps),
+        and after it gets much louder the low bound follows in about 3.3 half-lives (~600 updates, ~10 s). The high bound rises within a few updates.
+
+        :param percentiles: The percentiles (0-1) of recent levels to use as the low and high db.
+        :type percentiles: tuple[float, float]
+        :param half_life: After how many updates a level counts half as much. Adaptation time scales with it.
+        :type half_life: int
+        :param refresh: How many updates between recomputing the range.
+        :type refresh: int
+        :param warmup: How many updates before the range is used at all.
+        :type warmup: int
+        :param min_span: The smallest allowed high - low, in db, so near-constant levels aren't blown up.
+        :type min_span: float
+        :param db_range: The levels the histogram covers. Levels below it (silence) are ignored.
+        :type db_range: tuple[float, float]
+        :param bin_width: The width of each histogram bin in db.
+        :type bin_width: float
+        """
+        self.percentiles = percentiles
+        self.refresh = refresh
+        self.warmup = warmup
+        self.min_span = min_span
+        self.low = db_range[0]
+        self.bin_width = bin_width
+        self.bins = np.zeros(int((db_range[1] - db_range[0]) / bin_width))
+        # Instead of decaying every bin, new levels get an ever growing weight
+        self.weight = 1.0
+        self.growth = 2 ** (1 / half_life)
+        self.count = 0
+        self._refreshed_at = 0
+
+    def add(self, db: float):
+        """
+        Records a level in db.
+        """
+        if not np.isfinite(db) or db < self.low:
+            return
+        index = min(int((db - self.low) / self.bin_width), len(self.bins) - 1)
+        self.bins[index] += self.weight
+        self.weight *= self.growth
+        self.count += 1
+        if self.weight > 1e100:  # Rescale once in a long while to avoid overflow
+            self.bins /= self.weight
+            self.weight = 1.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the db level below which a q fraction (0-1) of the recent levels fall.
+        """
+        cumulative = np.cumsum(self.bins)
+        index = np.searchsorted(cumulative, q * cumulative[-1])
+        return self.low + (min(index, len(self.bins) - 1) + 0.5) * self.bin_width
+
+    def bounds(self) -> tuple[float, float] | None:
+        """
+        Returns the (low, high) db range when it's due for a refresh, otherwise None.
+        """
+        if self.count < self.warmup or self.count - self._refreshed_at < self.refresh:
+            return None
+        self._refreshed_at = self.count
+        low = self.quantile(self.percentiles[0])
+        high = max(self.quantile(self.percentiles[1]), low + self.min_span)
+        return low, high
+
+
 class BandSetting:
     def __init__(
         self,
         freq_range: tuple[int, int],
         db_range: tuple[int, int] = (-40, 40),
+        auto_gain: AutoGain | None = None,
     ) -> None:
+        """
+        The frequency and db range of one bar, and its current value.
+
+        :param freq_range: The low and high frequency of the band in hz.
+        :type freq_range: tuple[int, int]
+        :param db_range: The db levels shown as 0% and 100%.
+        :type db_range: tuple[int, int]
+        :param auto_gain: If given, db_range is only the starting range and is then derived from the band's levels.
+        :type auto_gain: AutoGain | None
+        """
         self.curr: float = 0
         self.low_freq = freq_range[0]
         self.high_freq = freq_range[1]
         self.low_db = db_range[0]
         self.high_db = db_range[1]
+        self.auto_gain = auto_gain
+
+    def observe(self, level: float):
+        """
+        Feeds a band level (magnitude or RMS, same scale as the db range) to the auto gain, if any.
+        """
+        if self.auto_gain is None:
+            return
+        self.auto_gain.add(20 * np.log10(level + 1e-10))
+        bounds = self.auto_gain.bounds()
+        if bounds:
+            self.low_db, self.high_db = bounds
 
 
 def get_spectrum(audio: np.ndarray, sample_rate: int) -> np.ndarray:
@@ -192,6 +303,13 @@ def compute_spectrum(
     decay: float = 0.1,
 ):
     audio = stream.mononize(stream.raw_to_float(stream.get()))
+    if audio.size == 0:  # No audio since the last call
+        return (
+            bass_setting.curr,
+            mid_setting.curr,
+            treble_setting.curr,
+            volume_setting.curr,
+        )
     spectrum = get_spectrum(audio, stream.sample_rate)
     # Get spectrum for each of the three ranges
     bass = spectrum[
@@ -207,6 +325,16 @@ def compute_spectrum(
         & (spectrum[:, 0] <= treble_setting.high_freq)
     ]
 
+    for setting, band in (
+        (bass_setting, bass),
+        (mid_setting, mid),
+        (treble_setting, treble),
+    ):
+        if band.size:
+            setting.observe(np.mean(band[:, 1]))
+    if audio.size:
+        volume_setting.observe(np.sqrt(np.mean(audio**2)))
+
     # Compute their percents
     bass_percent = compute_percent(
         bass[:, 1],
@@ -239,6 +367,208 @@ def compute_spectrum(
     return new_values
 
 
+def fft_db_offset(
+    setting: BandSetting, sample_rate: float, fft_size: int = 1024
+) -> float:
+    """
+    The db to add to a band's RMS so it reads like compute_spectrum's average FFT bin for noise-like audio.
+    Band RMS grows with the bandwidth while the bin average doesn't, so every band gets its own offset.
+    Tonal audio won't match exactly, as a tone's share of the bin average shrinks with the number of bins.
+
+    :param setting: The band, for its frequency range.
+    :type setting: BandSetting
+    :param sample_rate: The sample rate of the audio data.
+    :type sample_rate: float
+    :param fft_size: The number of samples compute_spectrum analyzes per frame (one chunk at normal frame rates).
+    :type fft_size: int
+    """
+    bandwidth = min(setting.high_freq, sample_rate / 2) - max(setting.low_freq, 0)
+    window_energy = np.sum(np.hanning(fft_size) ** 2)
+    # Power per bin of noise with the band's RMS, and the mean of its (Rayleigh distributed) magnitude
+    power = window_energy * sample_rate / (2 * max(bandwidth, 1))
+    return 10 * np.log10(power) + 20 * np.log10(np.sqrt(np.pi) / 2)
+
+
+def compute_crossover(
+    stream: Stream,
+    filterbank: CrossoverFilterbank,
+    bass_setting: BandSetting,
+    mid_setting: BandSetting,
+    treble_setting: BandSetting,
+    volume_setting: BandSetting,
+    decay: float = 0.1,
+    fft_size: int = 1024,
+):
+    """
+    Time-domain alternative to compute_spectrum. Results follow the newest chunk instead of the whole buffer.
+
+    :param filterbank: A filterbank built from the bass, mid and treble settings (in that order).
+    :type filterbank: CrossoverFilterbank
+    :param fft_size: The FFT size the db ranges were tuned for. Each band's RMS is offset (see fft_db_offset) so the same db ranges can be used.
+    :type fft_size: int
+    """
+    chunks = stream.raw_to_float(stream.get())
+    if chunks.ndim != 3:  # No audio yet
+        return (
+            bass_setting.curr,
+            mid_setting.curr,
+            treble_setting.curr,
+            volume_setting.curr,
+        )
+    chunks = np.mean(chunks, axis=-1)  # Mono, one row per chunk
+    settings = (bass_setting, mid_setting, treble_setting)
+    offsets = [fft_db_offset(s, stream.sample_rate, fft_size) for s in settings]
+    levels = filterbank.process(chunks) * 10 ** (np.array(offsets) / 20)
+    for level, setting in zip(levels, settings):
+        setting.observe(level)
+    volume_setting.observe(np.sqrt(np.mean(chunks**2)))
+
+    bass_percent, mid_percent, treble_percent = (
+        compute_percent(np.array([level]), setting.low_db, setting.high_db)
+        for level, setting in zip(levels, settings)
+    )
+    volume_percent = volume_db(
+        chunks,
+        volume_setting.low_db,
+        volume_setting.high_db,
+    )
+
+    # Apply decay
+    new_values = (
+        apply_decay(bass_setting.curr, bass_percent, decay=decay),
+        apply_decay(mid_setting.curr, mid_percent, decay=decay),
+        apply_decay(treble_setting.curr, treble_percent, decay=decay),
+        apply_decay(volume_setting.curr, volume_percent, decay=decay),
+    )
+    return new_values
+
+
+def collect_sources(
+    streams: list[Stream], split_channels: bool = True
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Gathers the new audio of several streams as rows of one array, resampled to the first stream's rate.
+    Every row is trimmed to the newest samples of the shortest source, so each FFT window and RMS only covers real audio.
+    The older samples of longer sources are dropped, not carried over to the next call.
+    Rows of sources with no new audio are zeros and marked as inactive.
+
+    :param streams: The streams to read from.
+    :type streams: list[Stream]
+    :param split_channels: Give each channel its own row instead of one mono row per stream.
+    :type split_channels: bool
+    :return: The audio as a (rows, samples) float32 array, and which rows got new audio.
+    :rtype: tuple[ndarray, ndarray]
+    """
+    sample_rate = streams[0].sample_rate
+    sources = []
+    for stream in streams:
+        channels = stream.loopback_info["maxInputChannels"]
+        audio = stream.raw_to_float(stream.get())
+        audio = audio.reshape(-1, channels).T if audio.size else np.zeros((channels, 0))
+        if not split_channels:
+            audio = audio.mean(axis=0, keepdims=True)
+        if stream.sample_rate != sample_rate and audio.shape[1]:
+            length = int(audio.shape[1] * sample_rate / stream.sample_rate)
+            old_times = np.arange(audio.shape[1]) / stream.sample_rate
+            new_times = np.arange(length) / sample_rate
+            audio = np.array([np.interp(new_times, old_times, row) for row in audio])
+        sources.append(audio)
+
+    lengths = [audio.shape[1] for audio in sources if audio.shape[1]]
+    length = min(lengths) if lengths else 0
+    rows = np.zeros((sum(len(audio) for audio in sources), length), dtype=np.float32)
+    active = np.zeros(len(rows), dtype=bool)
+    row = 0
+    for audio in sources:
+        if audio.shape[1]:
+            rows[row : row + len(audio)] = audio[:, audio.shape[1] - length :]
+            active[row : row + len(audio)] = True
+        row += len(audio)
+    return rows, active
+
+
+class MultiSourceAnalyzer:
+    def __init__(
+        self,
+        band_settings: list[BandSetting],
+        volume_setting: BandSetting,
+        sample_rate: int,
+    ) -> None:
+        """
+        compute_spectrum for many sources at once. Every row (channel or source) goes through one batched FFT and band reduction.
+
+        :param band_settings: The frequency and db ranges of each band.
+        :type band_settings: list[BandSetting]
+        :param volume_setting: The db range of the volume.
+        :type volume_setting: BandSetting
+        :param sample_rate: The sample rate of the audio data.
+        :type sample_rate: int
+        """
+        settings = band_settings + [volume_setting]
+        self.settings = settings
+        self.sample_rate = sample_rate
+        self.low_freq = np.array([s.low_freq for s in band_settings])
+        self.high_freq = np.array([s.high_freq for s in band_settings])
+        self.curr = np.zeros((0, len(self.settings)), dtype=np.float32)
+        self._cache = {}  # length: (window, band weights)
+
+    def _get_window(self, length: int) -> tuple[np.ndarray, np.ndarray]:
+        if length not in self._cache:
+            window = np.hanning(length).astype(np.float32)
+            freqs = np.fft.rfftfreq(length, d=1 / self.sample_rate)
+            masks = (freqs >= self.low_freq[:, None]) & (
+                freqs <= self.high_freq[:, None]
+            )
+            # Averages the bins of each band with one matmul
+            weights = masks / np.maximum(masks.sum(axis=1, keepdims=True), 1)
+            self._cache[length] = (window, weights.T.astype(np.float32))
+        return self._cache[length]
+
+    def process(
+        self,
+        audio: np.ndarray,
+        decay: float = 0.1,
+        active: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """
+        Updates and returns the level (0-1) of every band and the volume for each row.
+
+        :param audio: The audio as a (rows, samples) array, e.g. from collect_sources.
+        :type audio: np.ndarray
+        :param active: Which rows have new audio. The others keep their levels, like compute_spectrum without audio. Defaults to all rows.
+        :type active: np.ndarray | None
+        :return: The levels as a (rows, bands + 1) array, volume last.
+        :rtype: ndarray
+        """
+        if len(self.curr) != len(audio):
+            self.curr = np.zeros((len(audio), len(self.settings)), dtype=np.float32)
+        if active is None:
+            active = np.ones(len(audio), dtype=bool)
+        if audio.shape[-1] == 0 or not active.any():
+            return self.curr
+
+        window, weights = self._get_window(audio.shape[-1])
+        magnitude = np.abs(np.fft.rfft(audio * window, axis=-1))
+        levels = np.column_stack(
+            (magnitude @ weights, np.sqrt(np.mean(audio**2, axis=-1)))
+        )
+        # Auto gain follows the average over the active rows, so the rows stay comparable
+        for setting, level in zip(self.settings, levels[active].mean(axis=0)):
+            setting.observe(level)
+        low_db = np.array([s.low_db for s in self.settings], dtype=np.float32)
+        high_db = np.array([s.high_db for s in self.settings], dtype=np.float32)
+
+        db = 20 * np.log10(levels + 1e-10)
+        percent = np.clip((db - low_db) / (high_db - low_db), 0, 1)
+
+        # Same as apply_decay, for every row and band at once
+        curr = np.where(
+            percent >= self.curr, percent, self.curr * (1 - decay) + percent * decay
+        )
+        self.curr = np.where(active[:, None], curr, self.curr).astype(np.float32)
+        return self.curr
+
+
 # def download_vid(title):
 #     ydl_opts = {
 #         "format": "bestaudio/best",  # downloads best video and audio and merges them
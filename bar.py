@@ -1,4 +1,5 @@
 import colorama
+import re
 
 
 class Bar:
@@ -86,3 +87,63 @@ class MultiBar:
             print(bar)
 
         print(f"\x1b[{len(self.bars)}A", end="")
+
+
+class GroupedMultiBar:
+    def __init__(self, groups: dict[str, list[Bar]]) -> None:
+        """
+        Several MultiBars side by side, one column per group (e.g. per channel or source).
+        Groups that don't fit the console width wrap onto further rows.
+
+        :param groups: The bars of each group, keyed by the group's title. Bars of a group are shown top to bottom.
+        :type groups: dict[str, list[Bar]]
+        """
+        self.groups = groups
+        self.group_lines = 1 + max(len(bars) for bars in groups.values())
+        self.lines = self.group_lines  # Lines printed by the last show
+
+    def show(self, percents: list[list[float]], just: int = 0):
+        """
+        Shows every group. The cursor is moved back up afterwards, like MultiBar.
+
+        :param percents: The percentages of each group's bars, in the same order as the groups.
+        :type percents: list[list[float]]
+        :param just: The console width. Groups are wrapped to fit it, 0 keeps them on one row.
+        :type just: int
+        """
+        if len(percents) != len(self.groups):
+            raise ValueError("Number of percent groups must match number of groups")
+
+        columns = []
+        for (title, bars), group_percents in zip(self.groups.items(), percents):
+            if len(group_percents) != len(bars):
+                raise ValueError("Number of percents must match number of bars")
+            lines = [
+                bar.show(percent, True) for bar, percent in zip(bars, group_percents)
+            ]
+            # Visible widths, without the color codes
+            widths = [len(re.sub(r"\x1b\[[0-9;]*m", "", line)) for line in lines]
+            width = max(widths)
+            column = [title.ljust(width)] + [
+                line + " " * (width - line_width)
+                for line, line_width in zip(lines, widths)
+            ]
+            columns.append(column + [" " * width] * (self.group_lines - len(column)))
+
+        # Fill each row with as many columns as fit, at least one
+        rows = [[]]
+        row_width = 0
+        for column in columns:
+            width = len(column[0])
+            if rows[-1] and just and row_width + 2 + width > just:
+                rows.append([])
+                row_width = 0
+            row_width += (2 if rows[-1] else 0) + width
+            rows[-1].append(column)
+
+        for row_columns in rows:
+            for line in zip(*row_columns):
+                print("  ".join(line).ljust(just))
+        self.lines = len(rows) * self.group_lines
+
+        print(f"\x1b[{self.lines}A", end="")
@@ -0,0 +1,91 @@
+from audio import Stream, BandSetting, compute_spectrum, compute_crossover
+from crossover import CrossoverFilterbank
+from time import perf_counter
+import numpy as np
+
+"""
+Compares the FFT and crossover band analysis on synthetic audio.
+Latency: audio time from a bass tone starting to the bass bar reaching 90% of its final level.
+CPU: average time per frame.
+Usage: python benchmark.py
+"""
+
+SAMPLE_RATE = 48000
+CHUNK = 1024  # Same as Stream
+CHANNELS = 2
+
+
+class FakeStream:
+    """
+    Feeds prepared chunks through the real Stream conversion methods.
+    """
+
+    raw_to_float = Stream.raw_to_float
+    _bytes_to_float32 = Stream._bytes_to_float32
+    mononize = Stream.mononize
+
+    def __init__(self) -> None:
+        self.sample_rate = SAMPLE_RATE
+        self.loopback_info = {"maxInputChannels": CHANNELS}
+        self.frames = []
+
+    def get(self) -> list[bytes]:
+        frames, self.frames = self.frames, []
+        return frames
+
+
+def make_chunks(seconds: float, onset: float) -> list[bytes]:
+    """
+    Quiet noise with a 100hz tone starting at onset seconds, as interleaved int16 chunks.
+    """
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    rng = np.random.default_rng(0)
+    audio = 0.01 * rng.standard_normal(len(t))
+    audio += np.where(t >= onset, 0.5 * np.sin(2 * np.pi * 100 * t), 0)
+    audio = np.repeat(audio[:, None], CHANNELS, axis=1)
+    samples = (audio * 32767).astype(np.int16)
+    usable = len(samples) // CHUNK * CHUNK
+    return [chunk.tobytes() for chunk in samples[:usable].reshape(-1, CHUNK * CHANNELS)]
+
+
+def run(mode: str, chunks_per_frame: int, seconds: float = 3, onset: float = 1.51):
+    settings = [
+        BandSetting((20, 250), (-40, 40)),
+        BandSetting((200, 3500), (-40, 20)),
+        BandSetting((3000, 20000), (-60, 5)),
+        BandSetting((0, 0), (-70, -10)),
+    ]
+    filterbank = CrossoverFilterbank(settings[:3], SAMPLE_RATE)
+    stream = FakeStream()
+    chunks = make_chunks(seconds, onset)
+
+    bass = []
+    elapsed = 0.0
+    frames = 0
+    for i in range(0, len(chunks), chunks_per_frame):
+        stream.frames = chunks[i : i + chunks_per_frame]
+        start = perf_counter()
+        if mode == "crossover":
+            values = compute_crossover(stream, filterbank, *settings, decay=1)
+        else:
+            values = compute_spectrum(stream, *settings, decay=1)
+        elapsed += perf_counter() - start
+        frames += 1
+        for setting, value in zip(settings, values):
+            setting.curr = value
+        end_time = min(i + chunks_per_frame, len(chunks)) * CHUNK / SAMPLE_RATE
+        bass.append((end_time, values[0]))
+
+    final = bass[-1][1]
+    reached = next(t for t, value in bass if t > onset and value >= 0.9 * final)
+    return (reached - onset) * 1000, elapsed / frames * 1000
+
+
+if __name__ == "__main__":
+    print("mode       chunks/frame  latency (ms)  cpu/frame (ms)")
+    for chunks_per_frame in (1, 2, 4, 8):
+        for mode in ("fft", "crossover"):
+            latency, cpu = run(mode, chunks_per_frame)
+            print(
+                f"{mode.ljust(10)} {str(chunks_per_frame).ljust(13)} {latency:12.1f} {cpu:15.3f}"
+            )
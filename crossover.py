@@ -0,0 +1,207 @@
+import numpy as np
+
+"""
+Time-domain band analysis using a stateful biquad filterbank.
+Each band is a Linkwitz-Riley (two cascaded Butterworth biquads) high-pass/low-pass pair.
+Chunks are filtered with precomputed block matrices, so a whole batch of chunks is a few matmuls
+and the filter state carries over exactly between calls.
+"""
+
+
+def biquad(kind: str, freq: float, sample_rate: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Designs a 2nd order Butterworth filter (RBJ audio EQ cookbook).
+
+    :param kind: Either "lowpass" or "highpass".
+    :type kind: str
+    :param freq: The cutoff frequency in hz.
+    :type freq: float
+    :param sample_rate: The sample rate of the audio data.
+    :type sample_rate: float
+    :return: The normalized (b, a) coefficients.
+    :rtype: tuple[ndarray, ndarray]
+    """
+    w0 = 2 * np.pi * freq / sample_rate
+    alpha = np.sin(w0) / np.sqrt(2)  # Q = 1/sqrt(2)
+    cos = np.cos(w0)
+    if kind == "lowpass":
+        b = np.array([(1 - cos) / 2, 1 - cos, (1 - cos) / 2])
+    elif kind == "highpass":
+        b = np.array([(1 + cos) / 2, -(1 + cos), (1 + cos) / 2])
+    else:
+        raise ValueError(f"Unknown filter kind: {kind}")
+    a = np.array([1 + alpha, -2 * cos, 1 - alpha])
+    return b / a[0], a / a[0]
+
+
+def _state_space(sections: list[tuple[np.ndarray, np.ndarray]]):
+    """
+    Converts a cascade of biquads (transposed direct form II) into one state-space system.
+    """
+    order = 2 * len(sections)
+    A = np.zeros((order, order))
+    B = np.zeros(order)
+    C = np.zeros(order)
+    D = 1.0
+    for i, (b, a) in enumerate(sections):
+        s = slice(2 * i, 2 * i + 2)
+        A_i = np.array([[-a[1], 1.0], [-a[2], 0.0]])
+        B_i = np.array([b[1] - a[1] * b[0], b[2] - a[2] * b[0]])
+        C_i = np.array([1.0, 0.0])
+        # This section is fed by the output of the previous ones: u = C s + D x
+        A[s, : 2 * i] = np.outer(B_i, C[: 2 * i])
+        A[s, s] = A_i
+        B[s] = B_i * D
+        C = b[0] * C
+        C[s] = C_i
+        D = b[0] * D
+    return A, B, C, D
+
+
+def band_sections(
+    low_freq: float, high_freq: float, sample_rate: float
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Designs the biquads for one band: a Linkwitz-Riley high-pass at low_freq and low-pass at high_freq.
+
+    :param low_freq: The high-pass cutoff. Set to 0 or less to skip it.
+    :type low_freq: float
+    :param high_freq: The low-pass cutoff. Skipped if at or above nyquist.
+    :type high_freq: float
+    :param sample_rate: The sample rate of the audio data.
+    :type sample_rate: float
+    """
+    sections = []
+    if low_freq > 0:
+        sections += [biquad("highpass", low_freq, sample_rate)] * 2
+    if high_freq < sample_rate / 2:
+        sections += [biquad("lowpass", high_freq, sample_rate)] * 2
+    if not sections:
+        # Pass-through
+        sections = [(np.array([1.0, 0.0, 0.0]), np.array([1.0, 0.0, 0.0]))]
+    return sections
+
+
+class CrossoverFilterbank:
+    def __init__(
+        self,
+        bands: list,
+        sample_rate: float,
+        release: float = 0,
+        block: int = 64,
+    ) -> None:
+        """
+        Splits audio into bands in the time domain and tracks an RMS envelope for each.
+        The filter state is kept between calls, so chunks can be fed in as they arrive.
+
+        :param bands: The BandSettings to take the frequency ranges from.
+        :type bands: list[BandSetting]
+        :param sample_rate: The sample rate of the audio data.
+        :type sample_rate: float
+        :param release: How long (in seconds) the envelope takes to fall by ~63%. 0 follows the newest chunk's RMS, e.g. when the caller smooths the levels itself (compute_crossover's decay).
+        :type release: float
+        :param block: Audio is filtered in blocks of this many samples. The matrices grow with block^2, the sequential state steps with 1/block.
+        :type block: int
+        """
+        self.sample_rate = sample_rate
+        self.release = release
+        self.block = block
+
+        # All bands as one block-diagonal system with one output per band
+        systems = [
+            _state_space(band_sections(band.low_freq, band.high_freq, sample_rate))
+            for band in bands
+        ]
+        order = sum(len(B) for _, B, _, _ in systems)
+        self.A = np.zeros((order, order))
+        self.B = np.zeros(order)
+        self.C = np.zeros((len(bands), order))
+        self.D = np.zeros(len(bands))
+        offset = 0
+        for i, (A, B, C, D) in enumerate(systems):
+            s = slice(offset, offset + len(B))
+            self.A[s, s] = A
+            self.B[s] = B
+            self.C[i, s] = C
+            self.D[i] = D
+            offset += len(B)
+
+        self.state = np.zeros(order)
+        self._blocks = {}
+        self.rms = np.zeros(len(bands))
+
+    def _get_blocks(self, length: int):
+        """
+        Builds (once per block length) the matrices mapping a block and the incoming state to the output and the next state.
+        """
+        if length not in self._blocks:
+            order = len(self.B)
+            powers = np.empty((length + 1, order, order))  # A^0 .. A^length
+            powers[0] = np.eye(order)
+            for n in range(1, length + 1):
+                powers[n] = self.A @ powers[n - 1]
+
+            # Impulse responses: h[0] = D, h[n] = C A^(n-1) B
+            impulse = np.empty((len(self.D), length))
+            impulse[:, 0] = self.D
+            impulse[:, 1:] = (self.C @ (powers[:-2] @ self.B)[..., None])[..., 0].T
+            lags = np.arange(length)[:, None] - np.arange(length)[None, :]
+            response = np.where(lags >= 0, impulse[:, np.clip(lags, 0, None)], 0.0)
+
+            observe = self.C @ powers[:-1]  # C A^n, (length, bands, order)
+            control = powers[length - 1 :: -1][:length] @ self.B  # A^(N-1-k) B
+            # Laid out so blocks can be multiplied from the left, output as (bands, samples)
+            self._blocks[length] = (
+                response.transpose(2, 0, 1).reshape(length, -1),
+                observe.transpose(2, 1, 0).reshape(order, -1),
+                control,
+                powers[length],
+            )
+        return self._blocks[length]
+
+    def filter(self, chunks: np.ndarray) -> np.ndarray:
+        """
+        Filters consecutive chunks of mono audio, continuing from the previous call.
+
+        :param chunks: The audio as a (chunks, samples) array.
+        :type chunks: np.ndarray
+        :return: The audio of each band as a (bands, chunks, samples) array.
+        :rtype: ndarray
+        """
+        length = self.block if chunks.shape[1] % self.block == 0 else chunks.shape[1]
+        blocks = chunks.reshape(-1, length)
+        response, observe, control, transition = self._get_blocks(length)
+        output = blocks @ response
+        inputs = blocks @ control
+        # Only the state is carried sequentially, one small step per block
+        states = np.empty((len(blocks), len(self.state)))
+        state = self.state
+        for i in range(len(blocks)):
+            states[i] = state
+            state = transition @ state + inputs[i]
+        self.state = state
+        output += states @ observe
+        output = output.reshape(chunks.shape[0], -1, len(self.D), length)
+        return output.transpose(2, 0, 1, 3).reshape(len(self.D), *chunks.shape)
+
+    def process(self, chunks: np.ndarray) -> np.ndarray:
+        """
+        Runs chunks of mono audio through every band and updates the envelope.
+
+        :param chunks: The audio as a (chunks, samples) array.
+        :type chunks: np.ndarray
+        :return: The RMS envelope of each band after the newest chunk.
+        :rtype: ndarray
+        """
+        if chunks.size == 0:
+            return self.rms
+        filtered = self.filter(chunks)
+        chunk_rms = np.sqrt(np.mean(filtered**2, axis=-1))  # (bands, chunks)
+
+        if self.release <= 0:
+            self.rms = chunk_rms[:, -1]
+            return self.rms
+        fall = np.exp(-chunks.shape[1] / (self.sample_rate * self.release))
+        for i in range(chunks.shape[0]):
+            self.rms = np.maximum(chunk_rms[:, i], self.rms * fall)
+        return self.rms
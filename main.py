@@ -1,11 +1,22 @@
-from audio import Stream, BandSetting, compute_spectrum
+from audio import (
+    Stream,
+    AutoGain,
+    BandSetting,
+    MultiSourceAnalyzer,
+    collect_sources,
+    compute_spectrum,
+    compute_crossover,
+)
+from crossover import CrossoverFilterbank
 from py_now_playing import NowPlaying
 from thumbnail import Thumbnail
 from transcriber import LyricManager
-from bar import Bar, MultiBar
+from bar import Bar, MultiBar, GroupedMultiBar
+from waterfall import Waterfall
 from ascii import AsciiImage
+from writer import FrameWriter
 from asyncio import run
-from time import monotonic
+from time import monotonic, sleep
 import numpy as np
 import threading
 import os
@@ -39,17 +50,34 @@ mid_db_range: tuple = (-40, 20)
 treble_db_range: tuple = (-60, 5)
 volume_db_range: tuple = (-70, -10)
 
+# Auto gain: derive the db ranges above from recent levels instead (they're only the starting point)
+auto_gain: bool = False
+auto_gain_percentiles: tuple = (0.1, 0.95)  # low, high
+
 decay: float = 0.3
+max_fps: float = 60  # Frames per second. 0 = unlimited
+# "fft" or "crossover" (time-domain. Same latency as fft, lower only when frames lag the audio
+# by 8+ chunks, and a bit more CPU. See benchmark.py)
+band_analysis: str = "fft"
+
+# Multi-source (one group of bars per channel/source, analyzed with one batched FFT):
+per_channel_bars: bool = False  # Split system audio into its channels (e.g. Left/Right)
+include_microphone: bool = False  # Add the default input device as another source
 
 # Ascii:
 ascii_art = True
 colored_ascii = True
+image_mode: str = "ascii"  # "ascii" or "half_block" (truecolor, sharper)
 ascii_size: int = 60
 ascii_square: bool = False  # Doesn't look quiet correct yet, but square enough /shrug
 
 # Lyrics:
 display_lyrics = True
 
+# Waterfall (band history under the bars):
+display_waterfall = False
+waterfall_height: int = 20  # Lines
+
 global_info = {
     "title": "",
     "artist": "",
@@ -88,12 +116,36 @@ treble_bar = Bar("Treble:", bar_total_length, 10, True)
 volume_bar = Bar("Volume:", bar_total_length, 10, True)
 
 bar = MultiBar([bass_bar, mid_bar, treble_bar, volume_bar])
+waterfall = Waterfall(len(bar.bars), waterfall_height)
 
 
 def update_bars(*percents):
     bar.show([*percents], get_console_width())
 
 
+def make_auto_gain() -> AutoGain | None:
+    return AutoGain(auto_gain_percentiles) if auto_gain else None
+
+
+def make_grouped_bars(streams: list[Stream]) -> GroupedMultiBar:
+    groups = {}
+    for i, stream in enumerate(streams):
+        source = "System" if i == 0 else "Mic"
+        channels = stream.channels if per_channel_bars else 1
+        if channels == 1:
+            names = [source]
+        elif channels == 2:
+            names = [f"{source} Left", f"{source} Right"]
+        else:
+            names = [f"{source} {channel + 1}" for channel in range(channels)]
+        for name in names:
+            groups[name] = [
+                Bar(label, bar_total_length, 10, True)
+                for label in ("Bass:", "Mid:", "Treble:", "Volume:")
+            ]
+    return GroupedMultiBar(groups)
+
+
 def get_console_width():
     try:
         size = os.get_terminal_size()
@@ -102,6 +154,14 @@ def get_console_width():
         return 80
 
 
+def get_console_height():
+    try:
+        size = os.get_terminal_size()
+        return size.lines
+    except OSError:
+        return 24
+
+
 def main():
     playing = NowPlaying()
     run(playing.initalize_mediamanger())
@@ -128,13 +188,27 @@ def main():
     # )
     thumbnail.get_thumbnail(title, player)
     ascii_image = AsciiImage("thumbnail.png")
+    writer = FrameWriter()  # After AsciiImage, so it writes through colorama
+    writer.install()  # Prints from other threads now go through the writer too
     # return
     # Initialize audio stream
     stream = Stream()
-    bass_setting = BandSetting(bass_range, bass_db_range)
-    mid_setting = BandSetting(mid_range, mid_db_range)
-    treble_setting = BandSetting(treble_range, treble_db_range)
-    volume_setting = BandSetting((0, 0), volume_db_range)
+    bass_setting = BandSetting(bass_range, bass_db_range, make_auto_gain())
+    mid_setting = BandSetting(mid_range, mid_db_range, make_auto_gain())
+    treble_setting = BandSetting(treble_range, treble_db_range, make_auto_gain())
+    volume_setting = BandSetting((0, 0), volume_db_range, make_auto_gain())
+    filterbank = CrossoverFilterbank(
+        [bass_setting, mid_setting, treble_setting], stream.sample_rate
+    )
+    multi_source = per_channel_bars or include_microphone
+    if multi_source:
+        streams = [stream] + ([Stream(input_device=True)] if include_microphone else [])
+        analyzer = MultiSourceAnalyzer(
+            [bass_setting, mid_setting, treble_setting],
+            volume_setting,
+            stream.sample_rate,
+        )
+        grouped_bars = make_grouped_bars(streams)
 
     # new_info_freq in Frames. Smaller value = more frequent updates, but more potential stutters
     # Also note that the higher this is set, the more lag there before song_start is updated
@@ -143,6 +217,7 @@ def main():
     song_start = monotonic()
     curr_time = 0
     paused_at = 0
+    next_frame = monotonic()
 
     # clear terminal
     # return
@@ -180,14 +255,35 @@ def main():
                 curr_time = 0
                 # Process audio
 
+            if multi_source:
+                audio, active = collect_sources(streams, per_channel_bars)
+                levels = analyzer.process(audio, decay, active)
+                new_values = tuple(levels.mean(axis=0))  # Overall, for the waterfall
+            elif band_analysis == "crossover":
+                new_values = compute_crossover(
+                    stream,
+                    filterbank,
+                    bass_setting,
+                    mid_setting,
+                    treble_setting,
+                    volume_setting,
+                    decay,
+                )
+            else:
+                new_values = compute_spectrum(
+                    stream,
+                    bass_setting,
+                    mid_setting,
+                    treble_setting,
+                    volume_setting,
+                    decay,
+                )
             (
                 bass_setting.curr,
                 mid_setting.curr,
                 treble_setting.curr,
                 volume_setting.curr,
-            ) = compute_spectrum(
-                stream, bass_setting, mid_setting, treble_setting, volume_setting, decay
-            )
+            ) = new_values
 
             curr_time = monotonic()
 
@@ -206,38 +302,91 @@ def main():
                 if lyric_manager.get_lyric(lyric_time):
                     lyric_to_display = lyric_manager.get_lyric(lyric_time)
 
-            # Display
-            if ascii_art:
-                for line in ascii_image.ascii_image_str(
-                    ascii_size, ascii_square, colored=colored_ascii
-                ):
-                    print(line, end="")
-
-            print("-" * get_console_width())
-            print(f"Title: {title}".ljust(get_console_width()))
-            print(f"Artist: {artist}".ljust(get_console_width()))
-            print("-" * get_console_width())
-            if display_lyrics:
-                print(f"Lyrics: {lyric_to_display}".ljust(get_console_width()))
-                print(
-                    f"Time: {int(curr_time - song_start)//60}m {int(curr_time - song_start)%60}s".ljust(
-                        get_console_width()
+            # Display (composed into one frame for the writer thread)
+            with writer.compose() as frame:
+                if display_lyrics and lyric_manager.needs_clear:
+                    lyric_manager.needs_clear = False
+                    print("\033c", end="")
+                    waterfall.invalidate()
+                lines = []
+                if ascii_art:
+                    if image_mode == "half_block":
+                        lines = ascii_image.half_block_image_str(
+                            ascii_size, ascii_square
+                        )
+                    else:
+                        lines = ascii_image.ascii_image_str(
+                            ascii_size, ascii_square, colored=colored_ascii
+                        )
+                    for line in lines:
+                        print(line, end="")
+
+                print("-" * get_console_width())
+                print(f"Title: {title}".ljust(get_console_width()))
+                print(f"Artist: {artist}".ljust(get_console_width()))
+                print("-" * get_console_width())
+                if display_lyrics:
+                    print(f"Lyrics: {lyric_to_display}".ljust(get_console_width()))
+                    print(
+                        f"Time: {int(curr_time - song_start)//60}m {int(curr_time - song_start)%60}s".ljust(
+                            get_console_width()
+                        )
                     )
-                )
+                    print("-" * get_console_width())
+                if multi_source:
+                    grouped_bars.show(
+                        (analyzer.curr * 100).tolist(), get_console_width()
+                    )
+                else:
+                    update_bars(
+                        bass_setting.curr * 100,
+                        mid_setting.curr * 100,
+                        treble_setting.curr * 100,
+                        volume_setting.curr * 100,
+                    )
+                # After showing, as grouped bars wrap to the console width
+                bar_lines = grouped_bars.lines if multi_source else len(bar.bars)
+                print(f"\x1b[{bar_lines}B", end="")  # Move cursor down to add Line
                 print("-" * get_console_width())
-            update_bars(
-                bass_setting.curr * 100,
-                mid_setting.curr * 100,
-                treble_setting.curr * 100,
-                volume_setting.curr * 100,
-            )
-            print(f"\x1b[{len(bar.bars)}B", end="")  # Move cursor down to add Line
-            print("-" * get_console_width())
-            print(f"\x1b[{ascii_size}A", end="")  # Move cursor up to redraw
-            print(f"\x1b[{ascii_size}A", end="")  # Move cursor up to redraw
+                if display_waterfall:
+                    # Lines above: image, info, lyrics, bars and separators
+                    rows_above = (
+                        len(lines) + 4 + (3 if display_lyrics else 0) + bar_lines + 1
+                    )
+                    waterfall.show(
+                        [
+                            bass_setting.curr,
+                            mid_setting.curr,
+                            treble_setting.curr,
+                            volume_setting.curr,
+                        ],
+                        rows_above + 1,
+                        get_console_width(),
+                        max_height=get_console_height() - rows_above,
+                    )
+                print(f"\x1b[{ascii_size}A", end="")  # Move cursor up to redraw
+                print(f"\x1b[{ascii_size}A", end="")  # Move cursor up to redraw
+            dropped = writer.dropped
+            writer.submit(frame.getvalue())
+            if writer.dropped != dropped:
+                # The dropped frame may have had a waterfall scroll step in it
+                waterfall.invalidate()
+
+            # Pace the loop so it doesn't spin on the same (or no) audio
+            if max_fps:
+                next_frame += 1 / max_fps
+                delay = next_frame - monotonic()
+                if delay > 0:
+                    sleep(delay)
+                else:
+                    next_frame = monotonic()  # Fell behind, don't try to catch up
 
     except KeyboardInterrupt:
+        writer.close()
+        thumbnail.resolver.close()  # Saves the thumbnail cache
         stream.terminate()
+        if include_microphone:
+            streams[1].terminate()
         print("\033c", end="")
         return
 
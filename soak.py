@@ -0,0 +1,302 @@
+from audio import Stream
+from thumbnail import Thumbnail, ThumbnailResolver
+from transcriber import LyricManager, LyricResolver
+from contextlib import redirect_stdout
+from PIL import Image
+from pathlib import Path
+import numpy as np
+import tracemalloc
+import threading
+import argparse
+import tempfile
+import random
+import time
+import main
+import sys
+import os
+
+"""
+Soak test: runs main.main() against fake media, audio and network sources through thousands of track changes,
+and fails if heap, RSS, live threads or open handles keep growing.
+Usage: python soak.py [--tracks 2000] [--frames-per-track 5] ... (see --help)
+"""
+
+CHUNK = 1024
+CHANNELS = 2
+
+
+def get_rss() -> int:
+    """Current resident memory of this process in bytes (0 if unknown)."""
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(),
+            ctypes.byref(counters),
+            counters.cb,
+        )
+        return counters.WorkingSetSize
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def get_open_handles() -> int:
+    """Open file descriptors (handles on Windows) of this process (0 if unknown)."""
+    if os.name == "nt":
+        import ctypes
+
+        count = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetProcessHandleCount(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(count)
+        )
+        return count.value
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return 0
+
+
+class Sample:
+    def __init__(self, track: int) -> None:
+        self.track = track
+        self.time = time.monotonic()
+        self.heap = tracemalloc.get_traced_memory()[0]
+        self.rss = get_rss()
+        self.threads = threading.active_count()
+        self.handles = get_open_handles()
+
+    def __str__(self) -> str:
+        return (
+            f"track {str(self.track).rjust(6)}  heap {self.heap / 2**20:8.2f} MB  "
+            f"rss {self.rss / 2**20:8.2f} MB  threads {str(self.threads).rjust(3)}  "
+            f"handles {str(self.handles).rjust(4)}"
+        )
+
+
+class FakeSession:
+    def __init__(self, playing: "FakeNowPlaying") -> None:
+        # A browser, so thumbnails are fetched
+        self.source_app_user_model_id = "chrome.exe"
+        self.playing = playing
+
+    def get_playback_info(self):
+        return type("PlaybackInfo", (), {"playback_status": 4})()
+
+
+class FakeNowPlaying:
+    """
+    Stands in for py_now_playing.NowPlaying. The harness moves it to the next track.
+    """
+
+    def __init__(self, titles: list[str]) -> None:
+        self.titles = titles
+        self.track = 0
+        session = FakeSession(self)
+        self._manager = type(
+            "Manager", (), {"get_current_session": lambda _: session}
+        )()
+
+    async def initalize_mediamanger(self):
+        return
+
+    async def get_now_playing(self, model_id: str) -> dict:
+        title = self.titles[self.track % len(self.titles)]
+        # Thumbnails are searched by artist, so a distinct one per track keeps the resolver busy
+        return {"title": title, "artist": f"Artist {self.track}"}
+
+
+class FakeStream:
+    """
+    Stands in for audio.Stream, feeding noise through the real conversion methods.
+    Also drives the soak: samples resources and changes tracks as frames are consumed.
+    """
+
+    raw_to_float = Stream.raw_to_float
+    _bytes_to_float32 = Stream._bytes_to_float32
+    mononize = Stream.mononize
+
+    def __init__(self, soak: "Soak") -> None:
+        self.soak = soak
+        self.sample_rate = 48000
+        self.loopback_info = {"maxInputChannels": CHANNELS}
+        rng = np.random.default_rng(0)
+        noise = (rng.standard_normal((8, CHUNK * CHANNELS)) * 3000).astype(np.int16)
+        self.chunks = [chunk.tobytes() for chunk in noise]
+
+    def get(self) -> list[bytes]:
+        self.soak.on_frame()
+        return random.sample(self.chunks, 2)
+
+    def terminate(self):
+        return
+
+
+class StubExtractor:
+    def __init__(self, url: str, delay: float) -> None:
+        self.url = url
+        self.delay = delay
+
+    def extract_info(self, query: str, download: bool = False) -> dict:
+        time.sleep(random.uniform(0, self.delay))
+        return {"entries": [{"thumbnail": self.url}]}
+
+
+class StubProvider:
+    def __init__(self, name: str, delay: float, hit_rate: float) -> None:
+        self.name = name
+        self.delay = delay
+        self.hit_rate = hit_rate
+
+    def __str__(self) -> str:
+        return self.name
+
+    def get_lrc(self, search_term: str) -> str | None:
+        time.sleep(random.uniform(0, self.delay))
+        if random.random() > self.hit_rate:
+            return None
+        lines = [f"[0{i // 60}:{i % 60:02}.00] line {i}" for i in range(0, 180, 3)]
+        return f"[ti:{search_term}]\n" + "\n".join(lines)
+
+
+class Soak:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.frames = 0
+        self.samples: list[Sample] = []
+        self.baseline: Sample | None = None
+        self.baseline_snapshot = None
+        titles = [f"Song {i} (Official Video)" for i in range(args.titles)]
+        self.playing = FakeNowPlaying(titles)
+
+    def on_frame(self):
+        self.frames += 1
+        if self.frames % self.args.frames_per_track == 0:
+            self.playing.track += 1
+            track = self.playing.track
+            if track % self.args.sample_every == 0 or track >= self.args.tracks:
+                sample = Sample(track)
+                self.samples.append(sample)
+                print(sample, file=sys.__stderr__, flush=True)
+                if self.baseline is None and track >= self.args.warmup:
+                    self.baseline = sample
+                    self.baseline_snapshot = tracemalloc.take_snapshot()
+            if track >= self.args.tracks:
+                raise KeyboardInterrupt  # main() exits cleanly on this
+
+    def patch_main(self, thumbnail_url: str):
+        args = self.args
+        # Nothing stays cached, so every track runs a query and rewrites the cache file
+        thumbnail_resolver = ThumbnailResolver(
+            "thumbnail_cache.json",
+            ttl=0,
+            extractor_factory=lambda: StubExtractor(thumbnail_url, args.delay),
+            save_delay=args.delay,
+        )
+        lyric_resolver = LyricResolver(
+            [
+                StubProvider("Fast", args.delay / 4, 0.5),
+                StubProvider("Slow", args.delay * 4, 0.9),
+                StubProvider("Flaky", args.delay, 0.2),
+            ],
+            timeout=args.delay * 2,
+        )
+        main.image_mode = args.image_mode
+        main.max_fps = 0  # Fake audio is always ready
+        main.NowPlaying = lambda: self.playing
+        main.Stream = lambda: FakeStream(self)
+        main.Thumbnail = lambda: Thumbnail(thumbnail_resolver)
+        main.LyricManager = lambda title, artist: LyricManager(
+            title, artist, lyric_resolver
+        )
+
+    def run(self) -> bool:
+        with tempfile.TemporaryDirectory() as directory:
+            previous = os.getcwd()
+            os.chdir(directory)  # thumbnail.png and the caches are written to cwd
+            try:
+                source = os.path.join(directory, "source.jpg")
+                Image.new("RGB", (1280, 720), (40, 90, 160)).save(source)
+                self.patch_main(Path(source).as_uri())
+
+                tracemalloc.start()
+                with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                    main.main()
+                    time.sleep(self.args.settle)  # Let canceled work finish
+                # Only for reference: after shutdown the threads are gone and the caches may be freed
+                print(Sample(self.playing.track), "(settled)", file=sys.__stderr__)
+                return self.report(self.samples[-1])
+            finally:
+                tracemalloc.stop()
+                os.chdir(previous)
+
+    def report(self, final: Sample) -> bool:
+        """
+        Compares the last sample taken while main() was running against the baseline.
+        """
+        baseline = self.baseline or self.samples[0]
+        args = self.args
+        checks = [
+            ("heap", (final.heap - baseline.heap) / 2**20, args.max_heap_mb, "MB"),
+            ("rss", (final.rss - baseline.rss) / 2**20, args.max_rss_mb, "MB"),
+            ("threads", final.threads - baseline.threads, args.max_threads, ""),
+            ("handles", final.handles - baseline.handles, args.max_handles, ""),
+        ]
+        passed = True
+        print(f"\nGrowth since track {baseline.track}:", file=sys.__stderr__)
+        for name, growth, limit, unit in checks:
+            ok = growth <= limit
+            passed &= ok
+            print(
+                f"  {name.ljust(8)} {growth:+8.2f}{unit} (limit {limit}{unit}) {'ok' if ok else 'FAIL'}",
+                file=sys.__stderr__,
+            )
+        if not passed and self.baseline_snapshot:
+            print("\nTop heap growth:", file=sys.__stderr__)
+            diff = tracemalloc.take_snapshot().compare_to(
+                self.baseline_snapshot, "lineno"
+            )
+            for stat in diff[:10]:
+                print(" ", stat, file=sys.__stderr__)
+        return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Soak test main.main() against fake sources."
+    )
+    parser.add_argument("--tracks", type=int, default=2000)
+    parser.add_argument("--frames-per-track", type=int, default=5)
+    parser.add_argument("--image-mode", default=main.image_mode)
+    parser.add_argument("--titles", type=int, default=200, help="Distinct titles")
+    parser.add_argument("--delay", type=float, default=0.05, help="Fake network delay")
+    parser.add_argument(
+        "--warmup", type=int, default=200, help="Tracks before baseline"
+    )
+    parser.add_argument("--sample-every", type=int, default=100, help="In tracks")
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds")
+    parser.add_argument("--max-heap-mb", type=float, default=5)
+    parser.add_argument("--max-rss-mb", type=float, default=30)
+    parser.add_argument("--max-threads", type=int, default=5)
+    parser.add_argument("--max-handles", type=int, default=10)
+    args = parser.parse_args()
+    sys.exit(0 if Soak(args).run() else 1)
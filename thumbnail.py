@@ -1,13 +1,191 @@
 import yt_dlp, urllib.request as urllib
+from concurrent.futures import Future, CancelledError, TimeoutError
+from transcriber import strip_brackets
 import threading
+import tempfile
+import queue
+import json
+import time
+import os
+
+
+class ThumbnailResolver:
+    def __init__(
+        self,
+        cache_path: str = "thumbnail_cache.json",
+        ttl: float = 7 * 24 * 60 * 60,
+        extractor_factory=None,
+        timeout: float = 30.0,
+        save_delay: float = 5.0,
+    ) -> None:
+        """
+        Resolves search queries to YouTube thumbnail URLs with one long-lived YoutubeDL instance.
+        Queries run one at a time on a background worker and results are cached in memory and on disk.
+
+        :param cache_path: The JSON file to persist the cache to. Set to "" to keep it in memory only.
+        :type cache_path: str
+        :param ttl: How long (in seconds) a cached URL stays valid.
+        :type ttl: float
+        :param extractor_factory: Creates the object queries are run on. Must have extract_info(query, download=False). Defaults to a quiet YoutubeDL.
+        :param timeout: How long (in seconds) resolve waits for a query.
+        :type timeout: float
+        :param save_delay: The cache is written once no query has come in for this many seconds, instead of after every one.
+        :type save_delay: float
+        """
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.timeout = timeout
+        self.save_delay = save_delay
+        self.extractor_factory = extractor_factory or (
+            lambda: yt_dlp.YoutubeDL(
+                {"quiet": True, "skip_download": True, "no_warnings": True}
+            )
+        )
+        self.lock = threading.Lock()
+        self.cache: dict[str, tuple[str, float]] = {}  # query: (url, expires at)
+        self._dirty = False
+        self._load_cache()
+
+        self._queries = queue.Queue()
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+
+    def normalize(self, query: str) -> str:
+        """
+        Normalizes a query so variants of the same title share a cache entry.
+        """
+        return " ".join(strip_brackets(query).split())
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        self.cache = {
+            query: (url, expires)
+            for query, (url, expires) in entries.items()
+            if expires > now
+        }
+
+    def _store(self, query: str, url: str):
+        now = time.time()
+        with self.lock:
+            # Expired entries are dropped here so the cache doesn't grow over a long run
+            self.cache = {
+                key: entry for key, entry in self.cache.items() if entry[1] > now
+            }
+            self.cache[query] = (url, now + self.ttl)
+            self._dirty = True
+
+    def _save_cache(self):
+        with self.lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            entries = dict(self.cache)
+        if not self.cache_path:
+            return
+        temp_path = None
+        try:
+            # A unique temporary file, so several writers never share one
+            fd, temp_path = tempfile.mkstemp(
+                suffix=".tmp",
+                prefix=os.path.basename(self.cache_path) + ".",
+                dir=os.path.dirname(os.path.abspath(self.cache_path)),
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(entries, file)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print("Error saving thumbnail cache:", str(e))
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _work(self):
+        # Built up front so the first query doesn't pay for the startup. Retried per query if it fails.
+        try:
+            extractor = self.extractor_factory()
+        except Exception:
+            extractor = None
+        while True:
+            try:
+                item = self._queries.get(
+                    timeout=self.save_delay if self._dirty else None
+                )
+            except queue.Empty:
+                self._save_cache()
+                continue
+            if item is None:  # Closed
+                return
+            query, future, cancel = item
+            # Skip queries nobody is waiting for anymore, e.g. the song already changed
+            if (cancel is not None and cancel.is_set()) or (
+                not future.set_running_or_notify_cancel()
+            ):
+                future.cancel()
+                continue
+            try:
+                if extractor is None:
+                    extractor = self.extractor_factory()
+                info = extractor.extract_info(f"ytsearch1:{query}", download=False)
+                url = info["entries"][0]["thumbnail"]
+                self._store(query, url)
+                future.set_result(url)
+            except Exception as e:
+                future.set_exception(e)
+
+    def close(self, timeout: float = 1.0):
+        """
+        Stops the worker and writes any cache entries that haven't been saved yet.
+
+        :param timeout: How long to wait for a running query, in seconds.
+        :type timeout: float
+        """
+        self._queries.put(None)
+        self.thread.join(timeout)
+        self._save_cache()
+
+    def resolve(self, query: str, cancel: threading.Event | None = None) -> str:
+        """
+        Gets the thumbnail URL for a query, from the cache if possible. Blocks until resolved or timed out.
+
+        :param query: The search query, usually the song title.
+        :type query: str
+        :param cancel: If set before the worker gets to the query, the query is skipped.
+        :type cancel: threading.Event | None
+        :return: The thumbnail URL.
+        :rtype: str
+        :raises TimeoutError: If the query isn't resolved within the timeout.
+        :raises CancelledError: If the query was skipped.
+        """
+        query = self.normalize(query)
+        with self.lock:
+            url, expires = self.cache.get(query, ("", 0))
+        if expires > time.time():
+            return url
+
+        future = Future()
+        self._queries.put((query, future, cancel))
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()  # Skipped if still queued, cached anyway if already running
+            raise
 
 
 class Thumbnail:
-    def __init__(self) -> None:
+    def __init__(self, resolver: ThumbnailResolver | None = None) -> None:
         self.lock = threading.Lock()
         self._stop_event = threading.Event()
+        self.resolver = resolver or ThumbnailResolver()
 
-    def _fetch_thumbnail(self, title: str, player: str) -> str:
+    def _fetch_thumbnail(
+        self, title: str, player: str, event: threading.Event | None = None
+    ) -> str:
         """Fetches the thumbnail URL from YouTube based on the title and player name."""
 
         # Check if the player is a browser
@@ -15,11 +193,10 @@ class Thumbnail:
         if not any(browser in player.lower() for browser in browser_players):
             return ""
 
-        ydl_opts = {"quiet": True, "skip_download": True, "no_warnings": True}
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(f"ytsearch1:{title}", download=False)
-                return info["entries"][0]["thumbnail"]
+            return self.resolver.resolve(title, event)
+        except CancelledError:
+            return ""  # The song changed before the query ran
         except Exception as e:
             print("Error fetching thumbnail:", str(e))
             return ""
@@ -36,7 +213,7 @@ class Thumbnail:
 
     def get_thumbnail(self, title: str, player: str) -> None:
         def _get(title: str, player: str, event: threading.Event):
-            url = self._fetch_thumbnail(title, player)
+            url = self._fetch_thumbnail(title, player, event)
             if event.is_set():
                 return
             self._save_thumbnail(url, "thumbnail.png")
@@ -1,16 +1,185 @@
-import syncedlyrics as sl
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from syncedlyrics.providers import Lrclib, NetEase, Megalobiz, Genius
+import rapidfuzz
 import threading
 import time
 import re
 
 
+def strip_brackets(title: str) -> str:
+    """
+    Lowercases a title and removes bracketed parts like (Official Video) or 【MV】.
+    """
+    pattern = r"[【\[\(\{「][^】\]\)\}」]+[】\]\)\}」]"
+    return re.sub(pattern, "", title.lower()).strip()
+
+
+class ProviderStats:
+    def __init__(self) -> None:
+        """
+        Running latency and hit-rate stats for one lyric provider.
+        """
+        self.attempts = 0
+        self.hits = 0
+        self.total_latency = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        # Smoothed so new providers start at 50% instead of 0% or 100%
+        return (self.hits + 1) / (self.attempts + 2)
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.attempts if self.attempts else 0.0
+
+    def record(self, latency: float, hit: bool) -> None:
+        self.attempts += 1
+        self.hits += int(hit)
+        self.total_latency += latency
+
+
+class LyricResolver:
+    def __init__(
+        self,
+        providers: list | None = None,
+        timeout: float = 8.0,
+        threshold: float = 80,
+        timeouts: dict[str, float] | None = None,
+    ) -> None:
+        """
+        Queries several lyric providers at once and returns the first result that matches the song.
+
+        :param providers: Objects with a get_lrc(search_term) method returning a Lyrics object, an LRC string or None. Defaults to the syncedlyrics providers.
+        :type providers: list | None
+        :param timeout: How long to wait for each provider, in seconds.
+        :type timeout: float
+        :param threshold: The minimum fuzzy score (0-100) for a tagged result to be accepted. Tagged results below it are dropped.
+        :type threshold: float
+        :param timeouts: Per provider timeouts, by provider name, overriding timeout.
+        :type timeouts: dict[str, float] | None
+        """
+        if providers is None:
+            providers = [Lrclib(), NetEase(), Megalobiz(), Genius()]
+        self.providers = providers
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.threshold = threshold
+        self.stats = {str(provider): ProviderStats() for provider in providers}
+        self.lock = threading.Lock()
+
+    def ordered_providers(self) -> list:
+        """
+        Returns the providers sorted by hit rate, then by mean latency.
+        """
+        with self.lock:
+            return sorted(
+                self.providers,
+                key=lambda p: (
+                    -self.stats[str(p)].hit_rate,
+                    self.stats[str(p)].mean_latency,
+                ),
+            )
+
+    def _lyrics_text(self, result) -> str:
+        if result is None:
+            return ""
+        if isinstance(result, str):
+            return result
+        return result.synced or ""
+
+    def score(self, lyrics: str, title: str, artist: str) -> float | None:
+        """
+        Scores the [ti:] and [ar:] tags of an LRC against the title and artist.
+
+        :return: The fuzzy score (0-100), or None if the LRC has no metadata tags.
+        :rtype: float | None
+        """
+        tags = dict(re.findall(r"^\[(ti|ar):([^\]]*)\]", lyrics, re.MULTILINE))
+        if not tags:
+            return None
+        found = f"{tags.get('ti', '')} {tags.get('ar', '')}".lower()
+        expected = f"{title} {artist}".lower()
+        return rapidfuzz.fuzz.token_set_ratio(expected, found)
+
+    def _query(self, provider, search_term: str) -> tuple[str, float]:
+        start = time.monotonic()
+        lyrics = ""
+        try:
+            lyrics = self._lyrics_text(provider.get_lrc(search_term))
+        except Exception:
+            pass
+        return lyrics, time.monotonic() - start
+
+    def _record(self, provider, latency: float, hit: bool):
+        with self.lock:
+            self.stats[str(provider)].record(latency, hit)
+
+    def resolve(self, title: str, artist: str) -> str:
+        """
+        Searches every provider concurrently, each with its own timeout.
+
+        Returns the first synced lyrics that either score at or above the threshold or have no tags to score.
+        Tagged results scoring below it are for a different song and are dropped.
+        Providers still running after that are abandoned. Only accepted results count as a hit in the provider stats.
+
+        :return: The synced lyrics in LRC format, or "" if none were found.
+        :rtype: str
+        """
+        search_term = f"{title} {artist}".strip()
+        providers = self.ordered_providers()
+        executor = ThreadPoolExecutor(max_workers=max(1, len(providers)))
+        start = time.monotonic()
+        futures = {
+            executor.submit(self._query, provider, search_term): provider
+            for provider in providers
+        }
+        deadlines = {
+            future: start + self.timeouts.get(str(provider), self.timeout)
+            for future, provider in futures.items()
+        }
+        pending = set(futures)
+        try:
+            while pending:
+                remaining = min(deadlines[future] for future in pending)
+                done, pending = wait(
+                    pending,
+                    timeout=max(0, remaining - time.monotonic()),
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    provider = futures[future]
+                    lyrics, latency = future.result()
+                    score = self.score(lyrics, title, artist) if lyrics else 0
+                    # Untagged results can't be checked, so they're taken as is
+                    accepted = bool(lyrics) and (
+                        score is None or score >= self.threshold
+                    )
+                    self._record(provider, latency, accepted)
+                    if accepted:
+                        return lyrics
+
+                now = time.monotonic()
+                for future in [f for f in pending if deadlines[f] <= now]:
+                    pending.discard(future)
+                    self._record(futures[future], now - start, False)  # Timed out
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return ""
+
+
 class LyricManager:
-    def __init__(self, title: str, artist: str) -> None:
+    def __init__(
+        self, title: str, artist: str, resolver: LyricResolver | None = None
+    ) -> None:
         self.title = title
         self.artist = artist
+        self.resolver = resolver or LyricResolver()
         self.timed_lyrics = {}
         self.lock = threading.Lock()
         self._stop_event = threading.Event()
+        self.needs_clear = (
+            False  # Set when new lyrics arrive, the render loop clears the console
+        )
         self.sanatize()
 
     def sanatize(self) -> str:
@@ -42,20 +211,13 @@ class LyricManager:
         #             .replace((outer[0] + term + outer[1]).strip(), "")
         #             .strip()
         #         )
-        pattern = r"[【\[\(\{「][^】\]\)\}」]+[】\]\)\}」]"
-
-        self.title = re.sub(pattern, "", self.title.lower()).lower().strip()
+        self.title = strip_brackets(self.title)
         self.artist = self.artist.replace("- Topic", "").strip()
 
         return self.title, self.artist
 
     def search(self) -> str:
-        lyrics = sl.search(
-            search_term=f"{self.title} {self.artist}",
-            synced_only=True,
-            providers=["Lrclib", "NetEase", "Megalobiz", "Genius"],
-        )
-        return lyrics or ""
+        return self.resolver.resolve(self.title, self.artist)
 
     def _lrc_time_to_seconds(self, lrc_time: str) -> int:
         lrc_times = lrc_time.split(":")
@@ -110,7 +272,7 @@ class LyricManager:
                 # else:
                 # print("\033c", end="")  # In case of error, clear console
 
-            print("\033c", end="")  # In case of error, clear console
+            self.needs_clear = True  # In case of error, clear console
 
         self._stop_event.set()
         self._stop_event = threading.Event()
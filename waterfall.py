@@ -0,0 +1,105 @@
+import numpy as np
+
+# Heat map stops, level: (r, g, b)
+_STOPS = np.array([0, 0.5, 0.9, 1])
+_COLORS = np.array([[0, 0, 60], [0, 200, 0], [230, 200, 0], [230, 0, 0]])
+
+
+class Waterfall:
+    def __init__(self, bands: int, height: int = 20) -> None:
+        """
+        A scrolling history (spectrogram) of band levels. Newest row at the bottom.
+        Each frame only draws the newest row and scrolls the rest with a terminal scroll region.
+
+        :param bands: The number of band levels given per frame.
+        :type bands: int
+        :param height: How many frames of history to show, in lines.
+        :type height: int
+        """
+        self.height = height
+        self.history = np.zeros((height, bands), dtype=np.float32)  # Ring buffer
+        self.index = 0  # Row the next frame is written to
+        self._last_layout = None
+
+    def invalidate(self):
+        """
+        Forces a full redraw on the next show. Call it whenever the screen is cleared or a frame with an incremental update never reached the screen.
+        """
+        self._last_layout = None
+
+    def push(self, levels: list[float]):
+        """
+        Adds a frame of band levels (0-1) to the history.
+        """
+        self.history[self.index] = np.clip(levels, 0, 1)
+        self.index = (self.index + 1) % self.height
+
+    def rows(self) -> np.ndarray:
+        """
+        Returns the history ordered from oldest to newest.
+        """
+        return np.roll(self.history, -self.index, axis=0)
+
+    def _row_str(self, levels: np.ndarray, width: int) -> str:
+        colors = np.stack(
+            [np.interp(levels, _STOPS, _COLORS[:, i]) for i in range(3)], axis=-1
+        ).astype(int)
+        edges = np.linspace(0, width, len(levels) + 1).astype(int)
+        return (
+            "".join(
+                f"\x1b[48;2;{r};{g};{b}m" + " " * (end - start)
+                for (r, g, b), start, end in zip(colors, edges[:-1], edges[1:])
+            )
+            + "\x1b[0m"
+        )
+
+    def show(
+        self,
+        levels: list[float],
+        top: int,
+        width: int,
+        ommit_print: bool = False,
+        max_height: int | None = None,
+    ) -> str:
+        """
+        Adds a frame and draws the panel. The cursor is left where it was.
+
+        :param levels: The level (0-1) of each band for this frame.
+        :type levels: list[float]
+        :param top: The terminal line (starting at 1) the panel starts on.
+        :type top: int
+        :param width: The width of the panel in characters.
+        :type width: int
+        :param ommit_print: Whether or not to actually print the panel.
+        :type ommit_print: bool
+        :param max_height: The most lines the panel may use, e.g. what's left of the terminal. Only the newest rows are drawn if it's smaller than height, nothing if it's below 1.
+        :type max_height: int | None
+        """
+        self.push(levels)
+        height = self.height if max_height is None else min(self.height, max_height)
+        if height < 1:
+            self._last_layout = None
+            return ""
+        bottom = top + height - 1
+
+        # Full redraw only on layout changes and after invalidate
+        if self._last_layout != (top, width, height):
+            self._last_layout = (top, width, height)
+            lines = [
+                f"\x1b[{top + i};1H" + self._row_str(row, width)
+                for i, row in enumerate(self.rows()[-height:])
+            ]
+            panel = "\x1b7" + "".join(lines) + "\x1b8"
+        else:
+            panel = (
+                "\x1b7"  # Save cursor
+                + f"\x1b[{top};{bottom}r"  # Scroll region (DECSTBM)
+                + f"\x1b[{bottom};1H\n"  # Line feed on the bottom margin scrolls it up
+                + self._row_str(self.history[self.index - 1], width)
+                + "\x1b[r"  # Reset scroll region
+                + "\x1b8"  # Restore cursor
+            )
+
+        if not ommit_print:
+            print(panel, end="", flush=True)
+        return panel
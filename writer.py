@@ -0,0 +1,126 @@
+from contextlib import contextmanager
+import threading
+import sys
+import io
+
+
+class _StdoutRouter:
+    """
+    Stands in for sys.stdout while a FrameWriter is installed.
+    Prints from the thread composing a frame go into that frame, everything else goes to the writer as a message.
+    """
+
+    def __init__(self, writer: "FrameWriter") -> None:
+        self.writer = writer
+
+    def write(self, text: str) -> int:
+        composing = self.writer._composing
+        if composing is not None and composing[0] is threading.current_thread():
+            return composing[1].write(text)
+        self.writer.message(text)
+        return len(text)
+
+    def flush(self):
+        return
+
+    def __getattr__(self, name: str):
+        return getattr(self.writer.stream, name)
+
+
+class FrameWriter:
+    def __init__(self, stream=None) -> None:
+        """
+        Writes frames to the terminal on its own thread so a slow terminal never blocks the caller.
+        Holds at most one pending frame: a newer frame replaces (drops) one that hasn't been written yet.
+
+        :param stream: Where frames are written. Defaults to the current sys.stdout.
+        """
+        self.stream = stream or sys.stdout
+        self.written = 0
+        self.dropped = 0
+        self._frame: str | None = None
+        self._messages: list[str] = []
+        self._composing: tuple[threading.Thread, io.StringIO] | None = None
+        self._previous_stdout = None
+        self._running = True
+        self._condition = threading.Condition()
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+
+    def install(self):
+        """
+        Routes sys.stdout through the writer until close, so prints from other threads can't land in the middle of a frame.
+        """
+        self._previous_stdout = sys.stdout
+        sys.stdout = _StdoutRouter(self)
+
+    @contextmanager
+    def compose(self):
+        """
+        Collects what the calling thread prints (while installed) into a frame.
+
+        :return: The frame being composed, pass its value to submit when done.
+        :rtype: io.StringIO
+        """
+        frame = io.StringIO()
+        self._composing = (threading.current_thread(), frame)
+        try:
+            yield frame
+        finally:
+            self._composing = None
+
+    def message(self, text: str):
+        """
+        Queues text (e.g. an error printed by another thread) to be written before the next frame. Messages are never dropped.
+
+        :param text: The text to write.
+        :type text: str
+        """
+        with self._condition:
+            self._messages.append(text)
+            self._condition.notify()
+
+    def submit(self, frame: str):
+        """
+        Hands a fully composed frame to the writer. Never blocks on the terminal.
+
+        :param frame: Everything to write for this frame, escape codes included.
+        :type frame: str
+        """
+        with self._condition:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._condition.notify()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while self._frame is None and not self._messages and self._running:
+                    self._condition.wait()
+                if self._frame is None and not self._messages:
+                    return
+                messages, self._messages = self._messages, []
+                frame, self._frame = self._frame, None
+            try:
+                self.stream.write("".join(messages) + (frame or ""))
+                self.stream.flush()
+            except (OSError, ValueError):
+                return  # Terminal is gone
+            if frame is not None:
+                self.written += 1
+
+    def close(self, timeout: float = 1.0):
+        """
+        Writes the pending frame and messages (if any), stops the writer thread and restores sys.stdout.
+
+        :param timeout: How long to wait for the last write, in seconds.
+        :type timeout: float
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self.thread.join(timeout)
+        if self._previous_stdout is not None:
+            sys.stdout = self._previous_stdout
+            self._previous_stdout = None